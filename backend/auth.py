@@ -1,74 +1,198 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Body
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlmodel.ext.asyncio.session import AsyncSession
-from datetime import datetime, timedelta
-from jose import JWTError, jwt
+from datetime import timedelta
+import jwt
+from jwt import InvalidTokenError as JWTError
 from typing import Optional
-from models import User
-from database import get_async_session
+from models import User, Account, Session, Subscription, normalize_email
+from database import get_async_session, AsyncSessionLocal
 from sqlmodel import select
+from sqlalchemy import bindparam, delete
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
 import os
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
+import time
+from config import settings
 
 # JWT Configuration
-SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here-should-be-long-and-random")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+# The HS256 header segment never changes, so encode it once
+_JWT_HEADER_B64 = _b64url(json.dumps({"alg": ALGORITHM, "typ": "JWT"}, separators=(",", ":")).encode())
+
+# Decoder built once so options aren't re-parsed per request; no audience claim is
+# issued, and exp/user_id must be present since the token cache relies on them
+jwt_decoder = jwt.PyJWT(options={"verify_aud": False, "require": ["exp", "user_id"]})
+
+# Password hashing is CPU-bound; run it off the event loop in a bounded pool
+# so concurrent logins don't stall other requests or exhaust memory
+hash_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="pwhash")
+
+# Short-lived cache of verified tokens -> user info, so repeated requests
+# with the same token skip JWT verification and the user lookup
+TOKEN_CACHE_TTL_SECONDS = 30
+token_cache = TTLCache(maxsize=10000, ttl=TOKEN_CACHE_TTL_SECONDS)
+
+# Hot-path statements built once at import and executed with bound parameters
+_SEL_USER_BY_EMAIL = select(User).where(User.email == bindparam("email"))
+_SEL_USER_AUTH_FIELDS_BY_ID = (
+    select(User.id, User.email, User.name, User.email_verified, User.is_admin)
+    .where(User.id == bindparam("user_id"))
+)
+_SEL_USER_LIST = select(User.id, User.email, User.name, User.is_admin).execution_options(yield_per=500)
 
 router = APIRouter()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
-# Dependency to get current user object from token
-async def get_current_user_obj(
-    token: str = Depends(oauth2_scheme),
-    session: AsyncSession = Depends(get_async_session)
-) -> User:
-    credentials_exception = HTTPException(
+def _token_cache_key(token: str) -> str:
+    return hashlib.blake2b(token.encode(), digest_size=16).hexdigest()
+
+def evict_cached_user(user_id: str):
+    """Drop all cached tokens belonging to a user"""
+    for key, info in list(token_cache.items()):
+        if info["user_id"] == user_id:
+            token_cache.pop(key, None)
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _get_cached_user(key: str) -> Optional[dict]:
+    info = token_cache.get(key)
+    if info is not None and info["exp"] > time.time():
+        return info
+    return None
+
+def _decode_token(token: str) -> dict:
+    """Verify token and return its payload, which always carries user_id"""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
+        payload = jwt_decoder.decode(token, settings.secret_key, algorithms=[ALGORITHM])
     except JWTError:
-        raise credentials_exception
+        raise _credentials_exception()
+    if payload.get("user_id") is None:
+        raise _credentials_exception()
+    return payload
 
-    user = await get_user_by_email(email, session)
+def _cache_user(key: str, user, exp: int) -> dict:
+    info = {
+        "user_id": user.id,
+        "email": user.email,
+        "name": user.name,
+        "email_verified": user.email_verified is not None,
+        "is_admin": user.is_admin,
+        "exp": exp,
+    }
+    token_cache[key] = info
+    return info
+
+async def _resolve_user(token: str, session: AsyncSession) -> dict:
+    """Validate token and return cached user info, hitting JWT + DB only on a miss"""
+    key = _token_cache_key(token)
+    info = _get_cached_user(key)
+    if info is not None:
+        return info
+
+    payload = _decode_token(token)
+    user = await get_user_auth_fields(payload["user_id"], session)
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
+    return _cache_user(key, user, payload["exp"])
+
+# Dependency to get current user object from token
+async def get_current_user_obj(
+    token: str = Depends(oauth2_scheme),
+    session: AsyncSession = Depends(get_async_session)
+) -> User:
+    key = _token_cache_key(token)
+    info = _get_cached_user(key)
+    payload = None
+    if info is not None:
+        user_id = info["user_id"]
+    else:
+        payload = _decode_token(token)
+        user_id = payload["user_id"]
+
+    # Callers mutate the user, so always load the full row - once, by primary key
+    user = await session.get(User, user_id)
+    if user is None:
+        evict_cached_user(user_id)
+        raise _credentials_exception()
+    if payload is not None:
+        _cache_user(key, user, payload["exp"])
     return user
 
+# Dependency that only lets admins through
+async def require_admin(current_user: User = Depends(get_current_user_obj)) -> User:
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Only admin can manage users")
+    return current_user
+
 # Helper functions
+async def stream_users_json():
+    """Yield all users as a JSON array, fetching rows in batches"""
+    # Own session: the request-scoped one may be closed before the body is streamed
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(_SEL_USER_LIST)
+        yield "["
+        first = True
+        async for user_id, email, name, is_admin in result:
+            row = json.dumps({"id": user_id, "email": email, "name": name, "is_admin": is_admin})
+            yield row if first else "," + row
+            first = False
+        yield "]"
+
+async def run_in_hash_pool(func, *args):
+    """Run a password hashing call in the hashing thread pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(hash_executor, func, *args)
+
 async def get_user_by_email(email: str, session: AsyncSession) -> Optional[User]:
     """Get user by email from database"""
-    result = await session.execute(select(User).where(User.email == email))
+    result = await session.execute(_SEL_USER_BY_EMAIL, {"email": normalize_email(email)})
     return result.scalars().first()
 
+async def get_user_auth_fields(user_id: str, session: AsyncSession):
+    """Get only the columns needed to identify a user by primary key, without loading the ORM object"""
+    result = await session.execute(_SEL_USER_AUTH_FIELDS_BY_ID, {"user_id": user_id})
+    return result.first()
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
     to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    if expires_delta is None:
+        expires_delta = timedelta(minutes=15)
+    to_encode.update({"exp": int(time.time() + expires_delta.total_seconds())})
+    payload_b64 = _b64url(json.dumps(to_encode, separators=(",", ":")).encode())
+    signing_input = f"{_JWT_HEADER_B64}.{payload_b64}"
+    signature = hmac.new(settings.secret_key, signing_input.encode(), hashlib.sha256).digest()
+    return f"{signing_input}.{_b64url(signature)}"
 
 async def authenticate_user(email: str, password: str, session: AsyncSession) -> Optional[User]:
     """Authenticate user with email and password"""
     user = await get_user_by_email(email, session)
     if not user:
         return None
-    if not user.verify_password(password):
+    old_hash = user.password_hash
+    if not await run_in_hash_pool(user.verify_password, password):
         return None
+    # Persist the upgraded hash if verify_password rehashed it
+    if user.password_hash != old_hash:
+        session.add(user)
+        await session.commit()
     return user
 
 # API Endpoints
@@ -86,7 +210,7 @@ async def login_for_access_token(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
     access_token = create_access_token(
         data={"sub": user.email, "user_id": user.id},
         expires_delta=access_token_expires
@@ -111,29 +235,13 @@ async def get_current_user(
     session: AsyncSession = Depends(get_async_session)
 ):
     """Get current authenticated user information"""
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-
-    user = await get_user_by_email(email, session)
-    if user is None:
-        raise credentials_exception
-
+    info = await _resolve_user(token, session)
     return {
-        "user_id": user.id,
-        "email": user.email,
-        "name": user.name,
-        "email_verified": user.email_verified is not None
+        "user_id": info["user_id"],
+        "email": info["email"],
+        "name": info["name"],
+        "email_verified": info["email_verified"],
+        "is_admin": info["is_admin"],
     }
 
 @router.post("/auth/change-password")
@@ -147,67 +255,59 @@ async def change_password(
     new_password = data.get("new_password")
     if not current_password or not new_password:
         raise HTTPException(status_code=400, detail="current_password and new_password are required")
-    if not current_user.verify_password(current_password):
+    if not await run_in_hash_pool(current_user.verify_password, current_password):
         raise HTTPException(status_code=400, detail="Current password is incorrect")
-    current_user.set_password(new_password)
+    await run_in_hash_pool(current_user.set_password, new_password)
     session.add(current_user)
     await session.commit()
+    evict_cached_user(current_user.id)
     return {"message": "Password changed successfully"}
 
 @router.get("/users")
 async def list_users(
-    session: AsyncSession = Depends(get_async_session),
-    current_user: User = Depends(get_current_user_obj),
+    current_user: User = Depends(require_admin),
 ):
     """List users (admin only)."""
-    if current_user.email != "admin@test.com":
-        raise HTTPException(status_code=403, detail="Only admin can manage users")
-    result = await session.execute(select(User))
-    users = result.scalars().all()
-    return [
-        {"id": u.id, "email": u.email, "name": u.name}
-        for u in users
-    ]
+    # Streamed so memory stays constant regardless of the number of users
+    return StreamingResponse(stream_users_json(), media_type="application/json")
 
 @router.post("/users")
 async def create_user(
     data: dict = Body(...),
     session: AsyncSession = Depends(get_async_session),
-    current_user: User = Depends(get_current_user_obj),
+    current_user: User = Depends(require_admin),
 ):
     """Create a new user (admin only)."""
-    if current_user.email != "admin@test.com":
-        raise HTTPException(status_code=403, detail="Only admin can manage users")
     email = data.get("email")
     name = data.get("name")
     password = data.get("password")
     if not email or not password:
         raise HTTPException(status_code=400, detail="email and password are required")
-    existing = await session.execute(select(User).where(User.email == email))
-    if existing.scalars().first():
+    if await get_user_by_email(email, session):
         raise HTTPException(status_code=400, detail="Email already exists")
-    user = User(email=email, name=name)
-    user.set_password(password)
+    user = User(email=normalize_email(email), name=name)
+    await run_in_hash_pool(user.set_password, password)
     session.add(user)
     await session.commit()
     await session.refresh(user)
-    return {"id": user.id, "email": user.email, "name": user.name}
+    return {"id": user.id, "email": user.email, "name": user.name, "is_admin": user.is_admin}
 
 @router.delete("/users/{user_id}")
 async def delete_user(
     user_id: str,
     session: AsyncSession = Depends(get_async_session),
-    current_user: User = Depends(get_current_user_obj),
+    current_user: User = Depends(require_admin),
 ):
     """Delete a user by ID (admin only)."""
-    if current_user.email != "admin@test.com":
-        raise HTTPException(status_code=403, detail="Only admin can manage users")
-    result = await session.execute(select(User).where(User.id == user_id))
-    user = result.scalars().first()
+    user = await session.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    if user.email == "admin@test.com":
+    if user.is_admin:
         raise HTTPException(status_code=400, detail="Cannot delete admin user")
+    # Relationships use passive deletes, so remove child rows ourselves
+    for child in (Account, Session, Subscription):
+        await session.execute(delete(child).where(child.user_id == user.id))
     await session.delete(user)
     await session.commit()
+    evict_cached_user(user.id)
     return {"message": "User deleted"}
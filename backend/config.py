@@ -0,0 +1,23 @@
+from pathlib import Path
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+# Application settings, read once from the environment / backend/.env at import
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(
+        env_file=Path(__file__).parent / ".env", extra="ignore", frozen=True
+    )
+
+    # JWT - secret kept as bytes so the HS256 signer never re-encodes it
+    secret_key: bytes = b"your-secret-key-here-should-be-long-and-random"
+    access_token_expire_minutes: int = 30
+
+    # Database - SQLite or PostgreSQL (the admin bootstrap relies on ON CONFLICT)
+    database_url: str = "sqlite+aiosqlite:///./database.db"
+    sql_echo: bool = False  # log every SQL statement
+    pool_size: int = 5
+    max_overflow: int = 10
+
+    # Ensure the default admin user exists on startup
+    init_admin: bool = True
+
+settings = Settings()
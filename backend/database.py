@@ -1,18 +1,49 @@
 from sqlmodel import SQLModel
+from sqlalchemy import event, inspect, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.orm import sessionmaker
 from typing import AsyncGenerator
-import os
-from dotenv import load_dotenv
+from contextlib import AsyncExitStack
+from config import settings
 
-# Load environment variables
-load_dotenv()
+IS_SQLITE = settings.database_url.startswith("sqlite")
 
-# Database URL - using SQLite by default
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./database.db")
+# Create async engine - long-lived pooled connections keep SQLite's page cache warm
+engine = create_async_engine(
+    settings.database_url,
+    echo=settings.sql_echo,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=settings.pool_size,
+    max_overflow=settings.max_overflow,
+    pool_recycle=1800,
+    pool_pre_ping=True,
+    connect_args={"check_same_thread": False} if IS_SQLITE else {},
+)
+
+# SQLite pragmas, applied to every new pooled connection. Most are
+# per-connection settings; journal_mode=WAL is persistent and database-wide, so
+# after the first connection it is a no-op. WAL lets readers proceed while a
+# write is in progress and mmap avoids copying pages into userspace on reads.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA temp_store=MEMORY",
+)
+
+def apply_sqlite_pragmas(async_engine):
+    """Register a connect hook that applies SQLITE_PRAGMAS to new connections"""
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
 
-# Create async engine
-engine = create_async_engine(DATABASE_URL, echo=True)
+if IS_SQLITE:
+    apply_sqlite_pragmas(engine)
 
 # Create async session maker
 AsyncSessionLocal = sessionmaker(
@@ -26,10 +57,50 @@ async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with AsyncSessionLocal() as session:
         yield session
 
+# Add columns introduced after the user table was first created
+async def upgrade_user_table(conn):
+    columns = await conn.run_sync(lambda c: {col["name"] for col in inspect(c).get_columns("user")})
+    if "is_admin" not in columns:
+        # "user" is reserved on PostgreSQL, so quote it for the current dialect
+        user_table = conn.dialect.identifier_preparer.quote("user")
+        await conn.execute(text(f"ALTER TABLE {user_table} ADD COLUMN is_admin BOOLEAN NOT NULL DEFAULT false"))
+        await conn.execute(text(f"CREATE INDEX ix_user_is_admin ON {user_table} (is_admin)"))
+        # Admin used to be identified by this hard-coded email
+        await conn.execute(
+            text(f"UPDATE {user_table} SET is_admin = :is_admin WHERE email = :email"),
+            {"is_admin": True, "email": "admin@test.com"},
+        )
+
+# Bring emails stored before normalization into canonical lowercase form
+async def normalize_user_emails(conn):
+    user_table = conn.dialect.identifier_preparer.quote("user")
+    # The unique index is on the raw value, so case-only duplicates can't be merged automatically
+    duplicates = (await conn.execute(text(
+        f"SELECT lower(trim(email)) FROM {user_table} "
+        f"GROUP BY lower(trim(email)) HAVING count(*) > 1"
+    ))).scalars().all()
+    if duplicates:
+        raise RuntimeError(
+            "Cannot normalize user emails; these addresses exist more than once "
+            f"ignoring case: {', '.join(duplicates)}. Merge or remove the duplicates first."
+        )
+    await conn.execute(text(
+        f"UPDATE {user_table} SET email = lower(trim(email)) WHERE email != lower(trim(email))"
+    ))
+
 # Initialize database
 async def init_db():
     # Import all models to register them
     from models import User, Account, Session, VerificationToken, Subscription
     async with engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.create_all)
-    print("Database initialized successfully!")
\ No newline at end of file
+        await upgrade_user_table(conn)
+        await normalize_user_emails(conn)
+    print("Database initialized successfully!")
+
+# Open pool_size connections at once so the pool is full before the first request
+async def warm_up_pool():
+    async with AsyncExitStack() as stack:
+        for _ in range(settings.pool_size):
+            conn = await stack.enter_async_context(engine.connect())
+            await conn.execute(text("SELECT 1"))
@@ -5,42 +5,50 @@ This script creates an admin user with the specified credentials.
 """
 
 import asyncio
-from models import User
-from database import AsyncSessionLocal
-from sqlmodel import select
-from datetime import datetime
+from models import User, ph, now_ms
+from database import AsyncSessionLocal, init_db, engine
+from sqlalchemy.dialects import postgresql, sqlite
+from uuid_extensions import uuid7str
+
+ADMIN_EMAIL = "admin@test.com"
+ADMIN_PASSWORD = "123456"
+ADMIN_NAME = "Admin User"
+
+# Dialects whose insert() supports ON CONFLICT DO NOTHING
+UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+async def ensure_admin_user(session, password_hash: str) -> bool:
+    """Insert the admin user unless one already exists. Returns True if created."""
+    insert = UPSERT_INSERTS.get(engine.dialect.name)
+    if insert is None:
+        raise RuntimeError(f"Admin bootstrap does not support the {engine.dialect.name} dialect")
+    now = now_ms()
+    # Single idempotent round-trip instead of select + insert
+    stmt = insert(User).values(
+        id=uuid7str(),
+        email=ADMIN_EMAIL,
+        name=ADMIN_NAME,
+        password_hash=password_hash,
+        email_verified=now,
+        is_admin=True,
+        created_at=now,
+        updated_at=now,
+    ).on_conflict_do_nothing(index_elements=["email"])
+    result = await session.execute(stmt)
+    await session.commit()
+    return result.rowcount > 0
 
 async def create_admin_user():
-    email = "admin@test.com"
-    password = "123456"
-    name = "Admin User"
-
+    # Make sure tables exist and older databases are upgraded first
+    await init_db()
     async with AsyncSessionLocal() as session:
-        # Check if admin user already exists
-        result = await session.execute(select(User).where(User.email == email))
-        existing_user = result.scalars().first()
-
-        if existing_user:
-            print(f"⚠️  Admin user already exists: {existing_user.email}")
+        if not await ensure_admin_user(session, ph.hash(ADMIN_PASSWORD)):
+            print(f"⚠️  Admin user already exists: {ADMIN_EMAIL}")
             return
 
-        # Create new admin user
-        admin_user = User(
-            email=email,
-            name=name,
-            email_verified=int(datetime.now().timestamp() * 1000)
-        )
-        admin_user.set_password(password)
-
-        session.add(admin_user)
-        await session.commit()
-        await session.refresh(admin_user)
-
         print(f"✅ Admin user created successfully!")
-        print(f"   Email: {admin_user.email}")
-        print(f"   Password: {password}")
-        print(f"   User ID: {admin_user.id}")
+        print(f"   Email: {ADMIN_EMAIL}")
+        print(f"   Password: {ADMIN_PASSWORD}")
 
 if __name__ == "__main__":
-    from datetime import datetime
-    asyncio.run(create_admin_user())
\ No newline at end of file
+    asyncio.run(create_admin_user())
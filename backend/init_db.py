@@ -10,6 +10,7 @@ from sqlmodel.pool import StaticPool
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 import os
+from database import apply_sqlite_pragmas, upgrade_user_table, normalize_user_emails
 
 async def create_database():
     # Use a synchronous engine for initialization
@@ -18,11 +19,14 @@ async def create_database():
         echo=True,
         poolclass=StaticPool,
     )
+    apply_sqlite_pragmas(sync_engine)
 
     async with sync_engine.begin() as conn:
         # Import all models to register them
         from models import User, Account, Session, VerificationToken, Subscription
         await conn.run_sync(SQLModel.metadata.create_all)
+        await upgrade_user_table(conn)
+        await normalize_user_emails(conn)
         print("✅ Database tables created successfully!")
 
 async def reset_database():
@@ -32,6 +36,7 @@ async def reset_database():
         echo=True,
         poolclass=StaticPool,
     )
+    apply_sqlite_pragmas(sync_engine)
 
     async with sync_engine.begin() as conn:
         # Import all models to register them
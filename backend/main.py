@@ -1,12 +1,11 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from database import init_db, AsyncSessionLocal
-from auth import router as auth_router
-from models import User
-from sqlmodel import select
-import os
-from datetime import datetime
+from database import init_db, warm_up_pool, AsyncSessionLocal
+from auth import router as auth_router, run_in_hash_pool
+from models import ph
+from init_admin import ensure_admin_user, ADMIN_EMAIL, ADMIN_PASSWORD
+from config import settings
 
 # Lifecycle management
 @asynccontextmanager
@@ -14,24 +13,17 @@ async def lifespan(app: FastAPI):
     # Startup
     await init_db()
 
+    # Move cold-start costs out of the first request: fill the connection pool
+    # and run one hash so the Argon2 threads and allocations are warm
+    await warm_up_pool()
+    await run_in_hash_pool(ph.hash, "warmup")
+
     # Optionally ensure admin exists on startup
-    if os.getenv("INIT_ADMIN", "true").lower() in ("1", "true", "yes"):  # default enabled
-        try:
-            async with AsyncSessionLocal() as session:
-                result = await session.execute(select(User).where(User.email == "admin@test.com"))
-                admin = result.scalars().first()
-                if not admin:
-                    admin = User(
-                        email="admin@test.com",
-                        name="Admin User",
-                        email_verified=int(datetime.now().timestamp() * 1000),
-                    )
-                    admin.set_password("123456")
-                    session.add(admin)
-                    await session.commit()
-                    print("✅ Admin user auto-created: admin@test.com / 123456")
-        except Exception as e:
-            print(f"⚠️ Failed to ensure admin on startup: {e}")
+    if settings.init_admin:
+        async with AsyncSessionLocal() as session:
+            password_hash = await run_in_hash_pool(ph.hash, ADMIN_PASSWORD)
+            if await ensure_admin_user(session, password_hash):
+                print(f"✅ Admin user auto-created: {ADMIN_EMAIL} / {ADMIN_PASSWORD}")
 
     yield
     # Shutdown
@@ -1,43 +1,80 @@
 from sqlmodel import SQLModel, Field, Relationship
 from typing import Optional, List
-from datetime import datetime
-import uuid
+import time
+from uuid_extensions import uuid7str
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError, InvalidHashError
 from passlib.context import CryptContext
 
+def now_ms() -> int:
+    """Current time as a timestamp in milliseconds"""
+    return time.time_ns() // 1_000_000
+
 # Base model for timestamps
 class TimestampMixin(SQLModel):
-    created_at: int = Field(default_factory=lambda: int(datetime.now().timestamp() * 1000))
-    updated_at: int = Field(default_factory=lambda: int(datetime.now().timestamp() * 1000))
+    created_at: int = Field(default_factory=now_ms)
+    updated_at: int = Field(default_factory=now_ms)
+
+def normalize_email(email: str) -> str:
+    """Canonical lowercase form of an email, so lookups stay exact index seeks"""
+    return email.strip().lower()
+
+# Password hasher - Argon2id with OWASP parameters (m=46 MiB, t=3, p=1)
+ph = PasswordHasher(time_cost=3, memory_cost=47104, parallelism=1)
 
-# Password hashing context - use sha256_crypt as fallback since bcrypt has issues
-pwd_context = CryptContext(schemes=["sha256_crypt"], deprecated="auto")
+# Verifier for sha256_crypt hashes stored before the switch to Argon2
+legacy_pwd_context = CryptContext(schemes=["sha256_crypt"])
 
 # User model
 class User(TimestampMixin, table=True):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()), primary_key=True)
+    id: str = Field(default_factory=uuid7str, primary_key=True)  # time-ordered UUIDv7
     name: Optional[str] = None
-    email: str = Field(index=True, unique=True)
+    email: str = Field(index=True, unique=True)  # always stored via normalize_email
     email_verified: Optional[int] = None  # timestamp in milliseconds
     image: Optional[str] = None
     password_hash: Optional[str] = None
+    is_admin: bool = Field(default=False, index=True)
 
-    # Relationships
-    accounts: List["Account"] = Relationship(back_populates="user")
-    sessions: List["Session"] = Relationship(back_populates="user")
-    subscriptions: List["Subscription"] = Relationship(back_populates="user")
+    # Relationships - never lazy-loaded (use selectinload explicitly); passive
+    # deletes so deleting a user doesn't load its children first. Child rows
+    # must be deleted explicitly (see auth.delete_user).
+    accounts: List["Account"] = Relationship(
+        back_populates="user",
+        sa_relationship_kwargs={"lazy": "raise", "passive_deletes": True},
+    )
+    sessions: List["Session"] = Relationship(
+        back_populates="user",
+        sa_relationship_kwargs={"lazy": "raise", "passive_deletes": True},
+    )
+    subscriptions: List["Subscription"] = Relationship(
+        back_populates="user",
+        sa_relationship_kwargs={"lazy": "raise", "passive_deletes": True},
+    )
 
     def set_password(self, password: str):
         """Set password by hashing it"""
-        # Ensure password is not too long for bcrypt (max 72 bytes)
-        if len(password.encode('utf-8')) > 72:
-            password = password[:72]  # Truncate to 72 bytes
-        self.password_hash = pwd_context.hash(password)
+        self.password_hash = ph.hash(password)
 
     def verify_password(self, password: str) -> bool:
         """Verify password against stored hash"""
         if self.password_hash is None:
             return False
-        return pwd_context.verify(password, self.password_hash)
+        try:
+            ph.verify(self.password_hash, password)
+        except InvalidHashError:
+            # Not an Argon2 hash; accept a valid legacy hash and upgrade it
+            if not legacy_pwd_context.identify(self.password_hash):
+                return False
+            if not legacy_pwd_context.verify(password, self.password_hash):
+                return False
+            self.password_hash = ph.hash(password)
+            return True
+        except VerificationError:
+            return False
+        # Upgrade hashes created with older parameters
+        if ph.check_needs_rehash(self.password_hash):
+            self.password_hash = ph.hash(password)
+        return True
 
 # Account model (for OAuth)
 class Account(SQLModel, table=True):
@@ -73,7 +110,7 @@ class VerificationToken(SQLModel, table=True):
 
 # Subscription model (Lemon Squeezy)
 class Subscription(TimestampMixin, table=True):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()), primary_key=True)
+    id: str = Field(default_factory=uuid7str, primary_key=True)
     user_id: str = Field(foreign_key="user.id")
     lemon_squeezy_id: str = Field(unique=True)  # Lemon Squeezy subscription ID
     order_id: str  # Lemon Squeezy order ID
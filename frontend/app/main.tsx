@@ -37,7 +37,7 @@ function App() {
     },
   })
 
-  const isAdmin = meQuery.data?.email === 'admin@test.com'
+  const isAdmin = meQuery.data?.is_admin === true
 
   const usersQuery = useQuery({
     queryKey: ['users', token],
@@ -244,7 +244,7 @@ function App() {
                       <div className="text-sm text-gray-600">{u.name || 'No name'}</div>
                     </div>
                     <div className="flex items-center gap-2">
-                      <Button variant="destructive" onClick={() => handleDeleteUser(u.id)} disabled={u.email === 'admin@test.com'}>Delete</Button>
+                      <Button variant="destructive" onClick={() => handleDeleteUser(u.id)} disabled={u.is_admin}>Delete</Button>
                     </div>
                   </div>
                 ))}